@@ -5,14 +5,19 @@ API маршруты приложения.
 """
 
 import logging
-from typing import Annotated
-
-from fastapi import APIRouter, Depends, HTTPException, status
+from collections.abc import AsyncIterator
+from typing import Annotated, Any, NoReturn
+
+import httpx
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from openai import OpenAIError
 
 from app.config import Settings, get_settings
 from app.models import ChatRequest, ChatResponse, ErrorResponse, HealthResponse
-from app.services.openai_service import OpenAIService
+from app.services.openai_service import OpenAIService, ServiceOverloadedError
 from app.services.prompt_service import PromptService
 
 logger = logging.getLogger(__name__)
@@ -20,19 +25,45 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api", tags=["chat"])
 
 
-def get_prompt_service(
-    settings: Annotated[Settings, Depends(get_settings)],
-) -> PromptService:
-    """Dependency для получения PromptService."""
-    return PromptService(settings)
+def get_prompt_service(request: Request) -> PromptService:
+    """Dependency для получения общего PromptService приложения."""
+    return request.app.state.prompt_service
 
 
-def get_openai_service(
-    settings: Annotated[Settings, Depends(get_settings)],
-    prompt_service: Annotated[PromptService, Depends(get_prompt_service)],
-) -> OpenAIService:
-    """Dependency для получения OpenAIService."""
-    return OpenAIService(settings, prompt_service)
+def get_openai_service(request: Request) -> OpenAIService:
+    """Dependency для получения общего OpenAIService приложения."""
+    return request.app.state.openai_service
+
+
+def _raise_http_error(e: Exception) -> NoReturn:
+    """
+    Преобразует ошибку обработки сообщения в HTTP-ответ.
+
+    Вызывается из блока except, чтобы logger.exception записал traceback.
+
+    Raises:
+        HTTPException: 503 при перегрузке сервера или ошибке OpenAI API,
+            500 при любой другой ошибке
+    """
+    if isinstance(e, ServiceOverloadedError):
+        logger.warning("Запрос отклонён: превышен лимит одновременных запросов")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервер перегружен. Попробуйте позже.",
+        ) from e
+
+    if isinstance(e, OpenAIError):
+        logger.error("Ошибка OpenAI API: %s", e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Сервис AI временно недоступен. Попробуйте позже.",
+        ) from e
+
+    logger.exception("Неожиданная ошибка: %s", e)
+    raise HTTPException(
+        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        detail="Произошла внутренняя ошибка сервера.",
+    ) from e
 
 
 @router.get(
@@ -69,7 +100,7 @@ async def chat(
     Принимает сообщение пользователя и историю разговора,
     отправляет запрос в OpenAI API и возвращает ответ.
     """
-    logger.info(f"Получено сообщение: {request.message[:50]}...")
+    logger.debug("Получено сообщение: %.50s...", request.message)
 
     try:
         response = await openai_service.send_message(
@@ -85,16 +116,88 @@ async def chat(
 
         return ChatResponse(response=response, is_secret_revealed=is_secret_revealed)
 
-    except OpenAIError as e:
-        logger.error(f"Ошибка OpenAI API: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Сервис AI временно недоступен. Попробуйте позже.",
-        ) from e
+    except Exception as e:
+        _raise_http_error(e)
+
+
+def _sse_event(data: dict[str, Any], event: str | None = None) -> bytes:
+    """Кодирует одно событие Server-Sent Events."""
+    frame = b"data: " + orjson.dumps(data) + b"\n\n"
+    if event is not None:
+        frame = b"event: " + event.encode() + b"\n" + frame
+    return frame
+
+
+async def _chat_event_stream(
+    deltas: AsyncIterator[str],
+    prompt_service: PromptService,
+) -> AsyncIterator[bytes]:
+    """
+    Пересылает фрагменты ответа клиенту в формате SSE.
+
+    Фрагменты отправляются событиями без имени с полем `delta`.
+    В конце приходит событие `done` с флагом `is_secret_revealed`,
+    а при обрыве потока - событие `error`.
+    """
+    scanner = prompt_service.secret_scanner()
+
+    try:
+        async for delta in deltas:
+            scanner.feed(delta)
+            yield _sse_event({"delta": delta})
+
+    # Поток может оборваться и на уровне HTTP (таймаут чтения, разрыв соединения)
+    except (OpenAIError, httpx.HTTPError) as e:
+        logger.error("Ошибка OpenAI API во время стриминга: %s", e)
+        yield _sse_event(
+            {"detail": "Сервис AI временно недоступен. Попробуйте позже."},
+            event="error",
+        )
+        return
+
+    if scanner.is_secret_revealed:
+        logger.info("Секретное слово было раскрыто!")
+
+    yield _sse_event({"is_secret_revealed": scanner.is_secret_revealed}, event="done")
+
+
+@router.post(
+    "/chat/stream",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"text/event-stream": {}}},
+        500: {"model": ErrorResponse, "description": "Ошибка сервера"},
+        503: {"model": ErrorResponse, "description": "Сервис недоступен"},
+    },
+    summary="Отправить сообщение в чат с потоковым ответом",
+    description="Отправляет сообщение пользователя AI и передаёт ответ по частям (SSE)",
+)
+async def chat_stream(
+    request: ChatRequest,
+    openai_service: Annotated[OpenAIService, Depends(get_openai_service)],
+    prompt_service: Annotated[PromptService, Depends(get_prompt_service)],
+) -> StreamingResponse:
+    """
+    Потоковый endpoint для общения с AI.
+
+    Клиент получает первые токены ответа, не дожидаясь окончания генерации.
+    """
+    logger.debug("Получено сообщение (stream): %.50s...", request.message)
+
+    try:
+        deltas = await openai_service.stream_message(
+            user_message=request.message,
+            conversation_history=request.conversation_history,
+        )
 
     except Exception as e:
-        logger.exception(f"Неожиданная ошибка: {e}")
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Произошла внутренняя ошибка сервера.",
-        ) from e
+        _raise_http_error(e)
+
+    return StreamingResponse(
+        _chat_event_stream(deltas, prompt_service),
+        media_type="text/event-stream",
+        # Закрывает поток OpenAI и освобождает слот, если клиент отключился раньше
+        background=BackgroundTask(deltas.aclose),
+        # Отключаем буферизацию на стороне nginx, иначе поток придёт одним куском
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -4,24 +4,71 @@
 Загружает переменные окружения и предоставляет типизированный доступ к настройкам.
 """
 
+import json
+import os
+from collections.abc import Callable
+from dataclasses import MISSING, dataclass, field, fields
 from functools import lru_cache
+from typing import Any
 
-from pydantic_settings import BaseSettings, SettingsConfigDict
+from dotenv import dotenv_values
 
 
-class Settings(BaseSettings):
-    """Настройки приложения."""
+def _parse_bool(value: str) -> bool:
+    """Разбирает булево значение переменной окружения."""
+    normalized = value.strip().lower()
+    if normalized in ("1", "true", "yes", "on"):
+        return True
+    if normalized in ("0", "false", "no", "off", ""):
+        return False
+    raise ValueError(f"Invalid boolean value: {value!r}")
 
-    model_config = SettingsConfigDict(
-        env_file=".env",
-        env_file_encoding="utf-8",
-        extra="ignore",
-    )
+
+def _parse_str_list(value: str) -> list[str]:
+    """Разбирает список строк в формате JSON."""
+    try:
+        parsed = json.loads(value)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"expected a JSON list of strings, got {value!r}") from e
+    if not isinstance(parsed, list) or not all(isinstance(item, str) for item in parsed):
+        raise ValueError(f"expected a JSON list of strings, got {value!r}")
+    return parsed
+
+
+# Преобразование строковых значений окружения в типы полей Settings
+_PARSERS: dict[Any, Callable[[str], Any]] = {
+    str: str,
+    int: int,
+    float: float,
+    bool: _parse_bool,
+    list[str]: _parse_str_list,
+}
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Настройки приложения."""
 
     # OpenAI / OpenRouter настройки
     openai_api_key: str
     openai_base_url: str = "https://openrouter.ai/api/v1"
     model_name: str = "x-ai/grok-4.1-fast"
+    # Повторы при сетевых ошибках, 429 и 5xx выполняет клиент OpenAI
+    openai_max_retries: int = 3
+
+    # Одновременные запросы к OpenAI API и очередь ожидания сверх них
+    max_concurrency: int = 32
+    max_queue_size: int = 64
+
+    # Пул HTTP-соединений к OpenAI API (на один процесс)
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 50
+    http_timeout: float = 30.0
+    http_connect_timeout: float = 5.0
+
+    # Кеш ответов для одинаковых диалогов (0 - отключить)
+    response_cache_size: int = 4096
+    response_cache_ttl: int = 600
 
     # Секретное слово
     secret_word: str = "ГОЙДА1703"
@@ -31,10 +78,60 @@ class Settings(BaseSettings):
     debug: bool = False
 
     # CORS настройки
-    cors_origins: list[str] = ["http://localhost:3000", "http://127.0.0.1:3000"]
+    cors_origins: list[str] = field(
+        default_factory=lambda: ["http://localhost:3000", "http://127.0.0.1:3000"]
+    )
+
+    @classmethod
+    def from_env(cls, env_file: str | None = ".env") -> "Settings":
+        """
+        Загружает настройки из переменных окружения и .env файла.
+
+        Имена переменных - имена полей в верхнем регистре. Переменные
+        окружения имеют приоритет над значениями из .env файла.
+
+        Args:
+            env_file: Путь к .env файлу (None - не читать файл)
+
+        Returns:
+            Настройки приложения
+
+        Raises:
+            ValueError: Если обязательная переменная не задана или значение невалидно
+            TypeError: Если для типа поля нет преобразователя
+        """
+        environ = {
+            key.upper(): value
+            for source in (dotenv_values(env_file) if env_file else {}, os.environ)
+            for key, value in source.items()
+            if value is not None
+        }
+
+        values: dict[str, Any] = {}
+        for settings_field in fields(cls):
+            name = settings_field.name.upper()
+            raw = environ.get(name)
+            if raw is None:
+                if (
+                    settings_field.default is MISSING
+                    and settings_field.default_factory is MISSING
+                ):
+                    raise ValueError(f"Environment variable {name} is required")
+                continue
+            parser = _PARSERS.get(settings_field.type)
+            if parser is None:
+                raise TypeError(
+                    f"Unsupported type {settings_field.type!r} for setting {name}"
+                )
+            try:
+                values[settings_field.name] = parser(raw)
+            except ValueError as e:
+                raise ValueError(f"Invalid value for {name}: {e}") from e
+
+        return cls(**values)
 
 
 @lru_cache
 def get_settings() -> Settings:
     """Получить singleton настроек приложения."""
-    return Settings()
+    return Settings.from_env()
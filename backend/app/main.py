@@ -10,9 +10,16 @@ from typing import AsyncGenerator
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.api.routes import router
 from app.config import get_settings
+from app.services.openai_service import (
+    OpenAIService,
+    create_http_client,
+    create_openai_client,
+)
+from app.services.prompt_service import PromptService
 
 # Настройка логирования
 logging.basicConfig(
@@ -26,11 +33,26 @@ logger = logging.getLogger(__name__)
 async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """Lifecycle менеджер приложения."""
     settings = get_settings()
-    logger.info(f"Запуск приложения: {settings.app_name}")
-    logger.info(f"Используемая модель: {settings.model_name}")
-    logger.info(f"Base URL: {settings.openai_base_url}")
-    yield
-    logger.info("Завершение работы приложения")
+    logger.info("Запуск приложения: %s", settings.app_name)
+    logger.info("Используемая модель: %s", settings.model_name)
+    logger.info("Base URL: %s", settings.openai_base_url)
+
+    # Сервисы не хранят состояния запроса, поэтому создаются один раз.
+    # Общий клиент сохраняет пул соединений между запросами.
+    app.state.http_client = create_http_client(settings)
+    app.state.openai_client = create_openai_client(settings, app.state.http_client)
+    app.state.prompt_service = PromptService(settings)
+    app.state.openai_service = OpenAIService(
+        settings,
+        app.state.prompt_service,
+        app.state.openai_client,
+        app.state.http_client,
+    )
+    try:
+        yield
+    finally:
+        await app.state.openai_client.close()
+        logger.info("Завершение работы приложения")
 
 
 def create_app() -> FastAPI:
@@ -42,6 +64,7 @@ def create_app() -> FastAPI:
         description="Интерактивная игра, где пользователи должны узнать у AI секретное слово",
         version="1.0.0",
         lifespan=lifespan,
+        default_response_class=ORJSONResponse,
         docs_url="/docs",
         redoc_url="/redoc",
     )
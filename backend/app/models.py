@@ -4,16 +4,16 @@ Pydantic модели для API.
 Определяет структуры данных для запросов и ответов.
 """
 
+from typing import Literal
+
 from pydantic import BaseModel, Field
 
 
 class Message(BaseModel):
     """Сообщение в истории разговора."""
 
-    role: str = Field(
-        ...,
-        description="Роль отправителя сообщения",
-        pattern="^(user|assistant|system)$",
+    role: Literal["user", "assistant", "system"] = Field(
+        ..., description="Роль отправителя сообщения"
     )
     content: str = Field(..., description="Содержимое сообщения", min_length=1)
 
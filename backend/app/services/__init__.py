@@ -1,5 +1,16 @@
 # Services module
-from .openai_service import OpenAIService
+from .openai_service import (
+    OpenAIService,
+    ServiceOverloadedError,
+    create_http_client,
+    create_openai_client,
+)
 from .prompt_service import PromptService
 
-__all__ = ["OpenAIService", "PromptService"]
+__all__ = [
+    "OpenAIService",
+    "PromptService",
+    "ServiceOverloadedError",
+    "create_http_client",
+    "create_openai_client",
+]
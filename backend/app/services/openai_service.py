@@ -4,11 +4,21 @@
 Управляет взаимодействием с OpenAI-совместимыми API (OpenRouter, OpenAI и др.)
 """
 
+import asyncio
+import hashlib
 import logging
+import sys
+import time
+from collections.abc import AsyncGenerator, AsyncIterator
+from contextlib import asynccontextmanager
+from functools import partial
 from typing import Any
-from asyncio import sleep
 
-from openai import AsyncOpenAI, OpenAIError
+import httpx
+import orjson
+from cachetools import TTLCache
+from openai import AsyncOpenAI, AsyncStream, DefaultAsyncHttpxClient
+from openai.types.chat import ChatCompletionChunk
 
 from app.config import Settings
 from app.models import Message
@@ -16,30 +26,141 @@ from app.services.prompt_service import PromptService
 
 logger = logging.getLogger(__name__)
 
+# Ключи и роли сообщений: во всех словарях один и тот же объект строки
+_KEY_ROLE = sys.intern("role")
+_KEY_CONTENT = sys.intern("content")
+_ROLE_SYSTEM = sys.intern("system")
+_ROLE_USER = sys.intern("user")
+_ROLE_ASSISTANT = sys.intern("assistant")
+
+# Роли, которые клиент может передавать в истории, и их канонические строки;
+# системный промпт задаём только мы
+_HISTORY_ROLES = {_ROLE_USER: _ROLE_USER, _ROLE_ASSISTANT: _ROLE_ASSISTANT}
+
+
+class ServiceOverloadedError(Exception):
+    """Превышен лимит одновременных запросов и очереди к OpenAI API."""
+
+
+def create_http_client(
+    settings: Settings,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> httpx.AsyncClient:
+    """
+    Создаёт HTTP-клиент для запросов к OpenAI API.
+
+    Клиент держит пул соединений, поэтому создаётся один раз
+    на всё приложение и переиспользуется между запросами.
+    HTTP/2 позволяет мультиплексировать параллельные запросы
+    в одном соединении.
+
+    Args:
+        settings: Настройки приложения
+        transport: Транспорт httpx (для тестов)
+
+    Returns:
+        HTTP-клиент с настроенным пулом соединений
+    """
+    return DefaultAsyncHttpxClient(
+        http2=True,
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+        ),
+        timeout=httpx.Timeout(
+            settings.http_timeout, connect=settings.http_connect_timeout
+        ),
+        transport=transport,
+    )
+
+
+def create_openai_client(
+    settings: Settings, http_client: httpx.AsyncClient
+) -> AsyncOpenAI:
+    """
+    Создаёт асинхронный клиент OpenAI поверх общего HTTP-клиента.
+
+    Args:
+        settings: Настройки приложения
+        http_client: HTTP-клиент из create_http_client
+
+    Returns:
+        Асинхронный клиент OpenAI
+    """
+    return AsyncOpenAI(
+        api_key=settings.openai_api_key,
+        base_url=settings.openai_base_url,
+        max_retries=settings.openai_max_retries,
+        http_client=http_client,
+    )
+
 
 class OpenAIService:
     """Сервис для отправки запросов к OpenAI API."""
-    max_retries_on_error = 3
-
-    def __init__(self, settings: Settings, prompt_service: PromptService) -> None:
+    # Сколько секунд успешный запрос к API подтверждает его доступность
+    health_check_fresh_seconds = 60.0
+    health_check_timeout = 2.0
+    completion_params: dict[str, Any] = {
+        "max_tokens": 1024,
+        "temperature": 0.44,
+        "top_p": 0.9,
+        "frequency_penalty": 0.3,
+    }
+
+    def __init__(
+        self,
+        settings: Settings,
+        prompt_service: PromptService,
+        client: AsyncOpenAI,
+        http_client: httpx.AsyncClient,
+    ) -> None:
         """
         Инициализация сервиса.
 
         Args:
             settings: Настройки приложения
             prompt_service: Сервис управления промптами
+            client: Общий асинхронный клиент OpenAI
+            http_client: HTTP-клиент, на котором построен client
+
+        Raises:
+            ValueError: Если системный промпт пуст
         """
         self.settings = settings
         self.prompt_service = prompt_service
-
-        # Инициализация асинхронного клиента OpenAI
-        self.client = AsyncOpenAI(
-            api_key=settings.openai_api_key,
-            base_url=settings.openai_base_url,
-        )
+        self.client = client
+        self.http_client = http_client
 
         self.model = settings.model_name
 
+        # Системное сообщение одно на все запросы: передаём один и тот же словарь
+        system_prompt = prompt_service.get_system_prompt()
+        if not system_prompt or not system_prompt.strip():
+            raise ValueError("System prompt cannot be empty")
+        self.system_message: dict[str, str] = {
+            _KEY_ROLE: _ROLE_SYSTEM,
+            _KEY_CONTENT: system_prompt,
+        }
+
+        # Ограничение параллельных запросов к API
+        self._semaphore = asyncio.Semaphore(settings.max_concurrency)
+        self._waiting = 0
+
+        # Время последнего успешного обращения к API (time.monotonic)
+        self._last_ok_ts = 0.0
+
+        # Выполняющиеся запросы: одинаковые диалоги ждут один ответ API
+        self._inflight: dict[bytes, asyncio.Task[str]] = {}
+        # Недавние ответы: одинаковые диалоги не доходят до API
+        self._response_cache: TTLCache[bytes, str] | None = (
+            TTLCache(
+                maxsize=settings.response_cache_size,
+                ttl=settings.response_cache_ttl,
+            )
+            if settings.response_cache_size > 0
+            else None
+        )
+
     def _build_messages(
         self, user_message: str, conversation_history: list[Message]
     ) -> list[dict[str, Any]]:
@@ -56,175 +177,231 @@ class OpenAIService:
         Raises:
             ValueError: При невалидных входных данных
         """
-        messages: list[dict[str, Any]] = []
-
-        # Добавляем системный промпт
-        system_prompt = self.prompt_service.get_system_prompt()
-        if not system_prompt or not system_prompt.strip():
-            raise ValueError("System prompt cannot be empty")
-        messages.append({"role": "system", "content": system_prompt})
-
-        # Валидируем и добавляем историю разговора
-        for i, msg in enumerate(conversation_history):
-            if msg.role not in ("user", "assistant", "system"):
-                raise ValueError(f"Message {i} in history: invalid role '{msg.role}'")
-            if not msg.content or not msg.content.strip():
-                raise ValueError(f"Message {i} in history: content cannot be empty")
-            messages.append({"role": msg.role, "content": msg.content})
-
         # Валидируем текущее сообщение пользователя
         if not user_message or not user_message.strip():
             raise ValueError("User message cannot be empty")
-        messages.append({"role": "user", "content": user_message})
 
-        return messages
+        # История уже провалидирована моделью Message на входе в API
+        return [
+            self.system_message,
+            *[
+                {_KEY_ROLE: role, _KEY_CONTENT: msg.content}
+                for msg in conversation_history
+                if (role := _HISTORY_ROLES.get(msg.role)) is not None
+            ],
+            {_KEY_ROLE: _ROLE_USER, _KEY_CONTENT: user_message},
+        ]
+
+    async def send_message(
+        self, user_message: str, conversation_history: list[Message]
+    ) -> str:
+        """
+        Отправляет сообщение в OpenAI API и возвращает ответ.
+
+        Args:
+            user_message: Сообщение от пользователя
+            conversation_history: История разговора
+
+        Returns:
+            Ответ от AI
+
+        Raises:
+            ValueError: При невалидных входных данных
+            OpenAIError: При ошибке API после всех попыток
+            ServiceOverloadedError: При превышении лимита одновременных запросов
+        """
+        # Формируем список сообщений для API
+        messages = self._build_messages(user_message, conversation_history)
+
+        key = self._messages_key(messages)
+        if self._response_cache is not None:
+            cached = self._response_cache.get(key)
+            if cached is not None:
+                logger.debug("Ответ взят из кеша")
+                return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._request_completion(messages))
+            self._inflight[key] = task
+            task.add_done_callback(partial(self._finish_inflight, key))
+        else:
+            logger.debug("Идентичный запрос уже выполняется, ожидаем его ответ")
+
+        # shield: отключение одного клиента не отменяет запрос для остальных
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _messages_key(messages: list[dict[str, Any]]) -> bytes:
+        """Вычисляет ключ диалога (системный промпт общий и в ключ не входит)."""
+        return hashlib.blake2b(orjson.dumps(messages[1:])).digest()
+
+    def _finish_inflight(self, key: bytes, task: asyncio.Task[str]) -> None:
+        """Убирает завершившийся запрос из выполняющихся и кеширует ответ."""
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        # Исключение получат ожидающие через shield; вызов exception() помечает
+        # его как полученное, чтобы не было предупреждения, если все отключились
+        if task.exception() is None and self._response_cache is not None:
+            self._response_cache[key] = task.result()
+
+    @asynccontextmanager
+    async def _concurrency_slot(self) -> AsyncIterator[None]:
+        """
+        Занимает слот для запроса к API.
+
+        Raises:
+            ServiceOverloadedError: Если все слоты заняты и очередь заполнена
+        """
+        if self._semaphore.locked() and self._waiting >= self.settings.max_queue_size:
+            raise ServiceOverloadedError("Too many concurrent requests to OpenAI API")
+
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        try:
+            yield
+        finally:
+            self._semaphore.release()
 
-    def _validate_messages(self, messages: list[dict[str, Any]]) -> None:
+    async def _request_completion(self, messages: list[dict[str, Any]]) -> str:
         """
-        Валидирует список сообщений перед отправкой в API.
+        Запрашивает ответ модели.
+
+        Повторы при сетевых ошибках, 429 и 5xx выполняет сам клиент OpenAI
+        (экспоненциальная задержка с jitter и учётом Retry-After).
 
         Args:
-            messages: Список сообщений для валидации
+            messages: Список сообщений в формате OpenAI API
+
+        Returns:
+            Ответ от AI
 
         Raises:
-            ValueError: Если сообщения невалидны
+            ValueError: При невалидном ответе API
+            OpenAIError: При ошибке API после всех попыток
+            ServiceOverloadedError: При превышении лимита одновременных запросов
         """
-        if not messages:
-            raise ValueError("Список сообщений не может быть пустым")
+        logger.debug("Отправка запроса к %s", self.model)
 
-        # Проверяем наличие обязательных ролей
-        roles = [msg.get("role") for msg in messages]
-        if "system" not in roles:
-            raise ValueError("Отсутствует системный промпт")
-        if "user" not in roles:
-            raise ValueError("Отсутствует сообщение пользователя")
+        async with self._concurrency_slot():
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                **self.completion_params,
+            )
 
-        # Проверяем структуру каждого сообщения
-        for i, msg in enumerate(messages):
-            if not isinstance(msg, dict):
-                raise ValueError(f"Сообщение {i} должно быть словарем")
+        # Валидация структуры ответа
+        if not response.choices:
+            raise ValueError("API returned no choices")
 
-            if "role" not in msg or "content" not in msg:
-                raise ValueError(f"Сообщение {i} должно содержать 'role' и 'content'")
+        message = response.choices[0].message
+        if not hasattr(message, 'content'):
+            raise ValueError("API response missing content field")
 
-            if msg["role"] not in ("system", "user", "assistant"):
-                raise ValueError(f"Сообщение {i}: недопустимая роль '{msg['role']}'")
+        assistant_message = message.content
 
-            if not isinstance(msg["content"], str):
-                raise ValueError(f"Сообщение {i}: content должен быть строкой")
+        # Валидация содержимого ответа
+        if assistant_message is None or not assistant_message.strip():
+            raise ValueError("API returned empty or whitespace-only response")
 
-            if not msg["content"].strip():
-                raise ValueError(f"Сообщение {i}: content не может быть пустым")
+        if len(assistant_message.strip()) <= 1:
+            raise ValueError("API returned suspiciously short response")
 
-        logger.debug(f"Валидация пройдена: {len(messages)} сообщений")
+        self._last_ok_ts = time.monotonic()
+        logger.debug("Успешно получен ответ от API")
+        return assistant_message
 
-    async def send_message(
+    async def stream_message(
         self, user_message: str, conversation_history: list[Message]
-    ) -> str:
+    ) -> AsyncGenerator[str, None]:
         """
-        Отправляет сообщение в OpenAI API и возвращает ответ.
+        Открывает потоковый ответ OpenAI API.
+
+        Запрос отправляется сразу, поэтому ошибки соединения и API
+        возникают здесь, до того как клиенту ушли первые байты.
+        Поток OpenAI и слот параллельных запросов заняты, пока генератор
+        не будет прочитан или закрыт через aclose().
 
         Args:
             user_message: Сообщение от пользователя
             conversation_history: История разговора
 
         Returns:
-            Ответ от AI
+            Асинхронный генератор фрагментов ответа
 
         Raises:
             ValueError: При невалидных входных данных
-            OpenAIError: При ошибке API после всех попыток
+            OpenAIError: При ошибке API
+            ServiceOverloadedError: При превышении лимита одновременных запросов
         """
-        # Формируем список сообщений для API
         messages = self._build_messages(user_message, conversation_history)
 
-        # Валидируем перед отправкой
-        self._validate_messages(messages)
-
-        last_error = None
+        logger.debug("Отправка потокового запроса к %s", self.model)
+        deltas = self._iter_deltas(messages)
+        # Запускаем генератор до открытия потока: дальше он приостановлен внутри
+        # finally и освободит слот и поток, даже если клиент не прочтёт ни байта
+        await anext(deltas)
+        return deltas
 
-        for attempt in range(self.max_retries_on_error + 1):
-            try:
-                logger.info(f"Отправка запроса к {self.model} (попытка {attempt + 1})")
+    async def _iter_deltas(
+        self, messages: list[dict[str, Any]]
+    ) -> AsyncGenerator[str, None]:
+        """
+        Открывает поток и извлекает из него текстовые фрагменты.
 
-                response = await self.client.chat.completions.create(
+        Первой отдаёт пустую строку - сигнал, что поток открыт.
+        """
+        async with self._concurrency_slot():
+            stream: AsyncStream[ChatCompletionChunk] = (
+                await self.client.chat.completions.create(
                     model=self.model,
                     messages=messages,
-                    max_tokens=1024,
-                    temperature=0.44,
-                    top_p=0.9,
-                    frequency_penalty=0.3,
+                    stream=True,
+                    **self.completion_params,
                 )
-
-                # Валидация структуры ответа
-                if not response.choices:
-                    raise ValueError("API returned no choices")
-
-                message = response.choices[0].message
-                if not hasattr(message, 'content'):
-                    raise ValueError("API response missing content field")
-
-                assistant_message = message.content
-
-                # Валидация содержимого ответа
-                if assistant_message is None or not assistant_message.strip():
-                    raise ValueError("API returned empty or whitespace-only response")
-
-                if len(assistant_message.strip()) <= 1:
-                    raise ValueError("API returned suspiciously short response")
-
-                logger.info("Успешно получен ответ от API")
-                return assistant_message
-
-            except (OpenAIError, ValueError, Exception) as e:
-                last_error = e
-                error_type = type(e).__name__
-
-                # Не повторяем запрос при ошибках валидации
-                if isinstance(e, ValueError):
-                    logger.error(f"Ошибка валидации ответа: {e}")
-                    raise last_error
-
-                # Retry logic для сетевых и API ошибок
-                if attempt < self.max_retries_on_error:
-                    wait_time = 2 ** attempt  # Exponential backoff: 1, 2, 4 секунды
-                    logger.warning(
-                        f"{error_type} (попытка {attempt + 1}/{self.max_retries_on_error + 1}): "
-                        f"{e}. Повтор через {wait_time}с"
-                    )
-                    await sleep(wait_time)
-                else:
-                    logger.error(
-                        f"Ошибка после {self.max_retries_on_error + 1} попыток. "
-                        f"Последняя ошибка: {error_type}: {e}"
-                    )
-                    raise last_error
-
-        # Safety net (недостижимый код, но на всякий случай)
-        if last_error:
-            raise last_error
-        raise OpenAIError(f"Failed after {self.max_retries_on_error + 1} attempts")
+            )
+            try:
+                self._last_ok_ts = time.monotonic()
+                yield ""
+
+                async for chunk in stream:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+            finally:
+                await stream.close()
 
     async def health_check(self) -> bool:
         """
-        Проверяет доступность API.
+        Проверяет доступность API, не расходуя токены.
+
+        Если недавно был успешный запрос к API, он и служит подтверждением.
+        Иначе выполняется простой HTTP-запрос к base URL: API доступен,
+        если сервер ответил без ошибки 5xx (401/404 тоже подходят).
 
         Returns:
             True если API доступен, False в противном случае
         """
+        if time.monotonic() - self._last_ok_ts < self.health_check_fresh_seconds:
+            return True
+
         try:
-            # Минимальный тестовый запрос
-            # Используем chat completion вместо models.list()
-            # так как не все провайдеры поддерживают список моделей
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[{"role": "user", "content": "health check"}],
-                max_tokens=5,
+            response = await self.http_client.get(
+                str(self.client.base_url),
+                timeout=httpx.Timeout(self.health_check_timeout),
             )
-
-            # Проверяем, что получили валидный ответ
-            return response is not None and len(response.choices) > 0
+            if response.status_code >= 500:
+                logger.error("Health check failed: HTTP %d", response.status_code)
+                return False
+            return True
 
         except Exception as e:
-            logger.error(f"Health check failed: {type(e).__name__}: {e}")
-            return False
\ No newline at end of file
+            logger.error("Health check failed: %s: %s", type(e).__name__, e)
+            return False
@@ -4,9 +4,17 @@
 Генерирует системный промпт с секретным словом и характеристиками доверенного лица.
 """
 
+from functools import lru_cache
+
 from app.config import Settings
 
 
+@lru_cache
+def _render_system_prompt(template: str, secret_word: str) -> str:
+    """Подставляет секретное слово в шаблон (результат кешируется)."""
+    return template.format(secret_word=secret_word)
+
+
 class PromptService:
     """Сервис для генерации и управления системными промптами."""
 
@@ -209,6 +217,7 @@ class PromptService:
         """
         self.settings = settings
         self.secret_word = settings.secret_word
+        self._secret_lower = settings.secret_word.lower()
 
     def get_system_prompt(self) -> str:
         """
@@ -217,7 +226,7 @@ class PromptService:
         Returns:
             Полный системный промпт
         """
-        return self.SYSTEM_PROMPT_TEMPLATE.format(secret_word=self.secret_word)
+        return _render_system_prompt(self.SYSTEM_PROMPT_TEMPLATE, self.secret_word)
 
     def check_secret_revealed(self, response: str) -> bool:
         """
@@ -229,4 +238,46 @@ class PromptService:
         Returns:
             True если секретное слово было раскрыто
         """
-        return self.secret_word.lower() in response.lower()
+        return self._secret_lower in response.lower()
+
+    def secret_scanner(self) -> "SecretScanner":
+        """
+        Создаёт сканер для поиска секретного слова в потоковом ответе.
+
+        Returns:
+            Новый сканер, привязанный к текущему секретному слову
+        """
+        return SecretScanner(self)
+
+
+class SecretScanner:
+    """Ищет секретное слово во фрагментах ответа, приходящих по частям."""
+
+    def __init__(self, prompt_service: PromptService) -> None:
+        """
+        Инициализация сканера.
+
+        Args:
+            prompt_service: Сервис, выполняющий проверку текста
+        """
+        self._prompt_service = prompt_service
+        # Хвоста такой длины достаточно, чтобы поймать слово на стыке фрагментов
+        self._tail_size = max(len(prompt_service.secret_word) - 1, 0)
+        self._tail = ""
+        self.is_secret_revealed = False
+
+    def feed(self, delta: str) -> bool:
+        """
+        Обрабатывает очередной фрагмент ответа.
+
+        Args:
+            delta: Новый фрагмент текста
+
+        Returns:
+            True если секретное слово уже встретилось в ответе
+        """
+        if not self.is_secret_revealed:
+            window = self._tail + delta
+            self.is_secret_revealed = self._prompt_service.check_secret_revealed(window)
+            self._tail = window[-self._tail_size :] if self._tail_size else ""
+        return self.is_secret_revealed
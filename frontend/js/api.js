@@ -31,6 +31,79 @@ export async function sendMessage(message, conversationHistory = []) {
     return await response.json();
 }
 
+/**
+ * Отправляет сообщение в чат и получает ответ AI по частям (SSE).
+ * @param {string} message - Сообщение пользователя
+ * @param {Array<Object>} conversationHistory - История разговора
+ * @param {function(string): void} onDelta - Вызывается с полным текстом ответа после каждого фрагмента
+ * @returns {Promise<Object>} Ответ с полями response и is_secret_revealed
+ */
+export async function streamMessage(message, conversationHistory = [], onDelta = () => {}) {
+    const response = await fetch(`${API_BASE_URL}/chat/stream`, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            message: message,
+            conversation_history: conversationHistory,
+        }),
+    });
+
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.detail || `HTTP error! status: ${response.status}`);
+    }
+
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    let text = '';
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += value;
+
+        // События SSE разделены пустой строкой
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const { event, data } = parseSseEvent(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+
+            if (event === 'done') {
+                return { response: text, is_secret_revealed: data.is_secret_revealed };
+            }
+            if (event === 'error') {
+                throw new Error(data.detail);
+            }
+            text += data.delta;
+            onDelta(text);
+        }
+    }
+
+    throw new Error('Соединение с сервером прервано');
+}
+
+/**
+ * Разбирает одно событие SSE.
+ * @param {string} frame - Строки события без завершающей пустой строки
+ * @returns {Object} Имя события (null для фрагментов) и данные
+ */
+function parseSseEvent(frame) {
+    let event = null;
+    let data = '';
+    for (const line of frame.split('\n')) {
+        if (line.startsWith('event: ')) {
+            event = line.slice(7);
+        } else if (line.startsWith('data: ')) {
+            data += line.slice(6);
+        }
+    }
+    return { event, data: JSON.parse(data) };
+}
+
 /**
  * Проверяет статус сервера.
  * @returns {Promise<Object>} Статус сервера
@@ -3,7 +3,7 @@
  * Управляет UI и координирует работу других модулей.
  */
 
-import { sendMessage } from './api.js';
+import { streamMessage } from './api.js';
 import { saveMessage, loadHistory, clearHistory, hasHistory } from './storage.js';
 
 // DOM элементы
@@ -98,26 +98,41 @@ async function handleSend() {
     setLoading(true);
     showThinkingIndicator();
 
+    // Элемент ответа AI создаётся с первым фрагментом
+    let aiMessageElement = null;
+
     try {
         // Получаем историю для отправки на сервер
         const history = loadHistory();
         // Убираем последнее сообщение (мы его уже добавили как текущее)
         const conversationHistory = history.slice(0, -1);
 
-        // Отправляем запрос
-        const response = await sendMessage(message, conversationHistory);
-
-        // Скрываем индикатор
+        // Отправляем запрос и показываем ответ по мере генерации
+        const response = await streamMessage(message, conversationHistory, (text) => {
+            if (!aiMessageElement) {
+                // Первый фрагмент: индикатор больше не нужен
+                hideThinkingIndicator();
+                aiMessageElement = addAIMessageToUI();
+            }
+            renderAIMessage(aiMessageElement, text);
+        });
+
+        // Скрываем индикатор (если ответ пришёл без фрагментов)
         hideThinkingIndicator();
 
         // Добавляем ответ AI
         const aiMessage = { role: 'assistant', content: response.response };
         saveMessage(aiMessage);
-        addAIMessageToUI(response.response, response.is_secret_revealed);
+        aiMessageElement = aiMessageElement || addAIMessageToUI();
+        renderAIMessage(aiMessageElement, response.response, response.is_secret_revealed);
 
     } catch (error) {
         console.error('Ошибка отправки:', error);
         hideThinkingIndicator();
+        // Недополученный ответ не сохраняется в истории
+        if (aiMessageElement) {
+            aiMessageElement.remove();
+        }
         showError(error.message || 'Произошла ошибка при отправке сообщения');
     } finally {
         setLoading(false);
@@ -220,18 +235,12 @@ function addUserMessageToUI(text) {
 }
 
 /**
- * Добавляет ответ AI в UI.
+ * Добавляет в UI пустое сообщение AI, которое заполняется по мере ответа.
  */
-function addAIMessageToUI(text, isSecretRevealed = false) {
+function addAIMessageToUI() {
     const div = document.createElement('div');
     div.className = 'ai-message';
-    
-    let formattedText = formatText(text);
-    if (isSecretRevealed) {
-        formattedText = `<div class="secret-revealed">${formattedText}</div>`;
-    }
-    
-    div.innerHTML = `<div class="content">${formattedText}</div>`;
+    div.innerHTML = '<div class="content"></div>';
     messagesContainer.appendChild(div);
 
     // Анимация появления
@@ -239,6 +248,19 @@ function addAIMessageToUI(text, isSecretRevealed = false) {
         div.classList.add('visible');
     });
 
+    return div;
+}
+
+/**
+ * Отображает текст ответа AI в сообщении.
+ */
+function renderAIMessage(div, text, isSecretRevealed = false) {
+    let formattedText = formatText(text);
+    if (isSecretRevealed) {
+        formattedText = `<div class="secret-revealed">${formattedText}</div>`;
+    }
+
+    div.querySelector('.content').innerHTML = formattedText;
     scrollToBottom();
 }
 